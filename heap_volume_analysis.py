@@ -1,15 +1,42 @@
+import os
 import geopandas as gpd
 import numpy as np
+from scipy import ndimage
 from scipy.interpolate import griddata
 import rasterio
-from rasterio.transform import from_origin
+from rasterio.transform import from_origin, rowcol
+from rasterio.windows import Window, transform as window_transform
 import pyproj
-from shapely import vectorized
+import shapely
 import laspy
 import pandas as pd
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
-def transform_polygons(input_file: str, output_file: str, target_crs: str = "EPSG:2180"):
+# Below this many polygons a bounding-box scan per polygon is cheaper than sorting the points for the index
+# (sorting costs roughly 90 scans).
+_MIN_POLYGONS_FOR_INDEX = 100
+# Number of LAS points read at a time.
+_LAS_CHUNK_SIZE = 1_000_000
+# Largest raster window read in one go when looking up DTM values; sparser lookups sample the raster instead.
+_MAX_DTM_WINDOW_CELLS = 25_000_000
+
+@lru_cache(maxsize=None)
+def _parse_crs(crs: str):
+    """
+    Parses a CRS definition. CRS definitions do not change, so each one is parsed once per process.
+    
+    Args:
+        crs (str): CRS definition, e.g. an EPSG code.
+    
+    Returns:
+        pyproj.CRS: Parsed CRS.
+    """
+    return pyproj.CRS.from_user_input(crs)
+
+def transform_polygons(input_file: str, output_file: str, target_crs: str = "EPSG:2180",
+                       transformer: pyproj.Transformer = None):
     """
     Transforms polygons from the input GeoJSON file to the specified CRS and saves the result.
     
@@ -17,16 +44,69 @@ def transform_polygons(input_file: str, output_file: str, target_crs: str = "EPS
         input_file (str): Path to the input GeoJSON file.
         output_file (str): Path to save the transformed GeoJSON file.
         target_crs (str): Target CRS in EPSG code. Defaults to 'EPSG:2180'.
+        transformer (pyproj.Transformer, optional): Prebuilt transformer from the input CRS to target_crs,
+            created with always_xy=True. Reusing one across files skips the per-call transformer setup.
     """
-    gdf = gpd.read_file(input_file)
+    gdf = gpd.read_file(input_file, engine="pyogrio")
     if gdf.crs is None:
         raise ValueError("Expected CRS for input file: EPSG:4326")
-    gdf_transformed = gdf.to_crs(target_crs)
-    gdf_transformed.to_file(output_file, driver="GeoJSON")
+    if transformer is None:
+        gdf_transformed = gdf.to_crs(_parse_crs(target_crs))
+    else:
+        geometry = shapely.transform(gdf.geometry.values,
+                                     lambda coords: np.column_stack(transformer.transform(*coords.T)),
+                                     include_z=None)
+        gdf_transformed = gdf.set_geometry(gpd.GeoSeries(geometry, index=gdf.index, crs=_parse_crs(target_crs)))
+    gdf_transformed.to_file(output_file, driver="GeoJSON", engine="pyogrio")
     print(f"Transformation completed. Results saved to {output_file}")
     return gdf
 
 
+def _interpolate_to_grid(x: np.ndarray, y: np.ndarray, z: np.ndarray, x_min: float, y_min: float,
+                         grid_size: float, shape: tuple):
+    """
+    Interpolates scattered points onto a regular grid. Each point is assigned to its nearest grid node
+    and nodes holding points take their mean height. Small holes take the mean height of the points in
+    their 3x3 neighbourhood, or are left as NaN if it holds none. Gaps wide enough to hold a whole empty
+    3x3 neighbourhood are linearly interpolated from the bordering nodes that have a height; nodes
+    outside their convex hull are left as NaN.
+    
+    Args:
+        x (np.ndarray): X coordinates of the points.
+        y (np.ndarray): Y coordinates of the points.
+        z (np.ndarray): Heights of the points.
+        x_min (float): X coordinate of the first grid column.
+        y_min (float): Y coordinate of the last (southernmost) grid row.
+        grid_size (float): Spacing of the grid nodes.
+        shape (tuple): Number of grid rows and columns.
+    
+    Returns:
+        np.ndarray: Float32 grid of heights, with rows ordered by decreasing y (north up).
+    """
+    n_rows, n_cols = shape
+    rows = n_rows - 1 - np.minimum(np.rint((y - y_min) / grid_size).astype(np.int64), n_rows - 1)
+    cols = np.minimum(np.rint((x - x_min) / grid_size).astype(np.int64), n_cols - 1)
+    cells = rows * n_cols + cols
+    counts = np.bincount(cells, minlength=n_rows * n_cols)
+    sums = np.bincount(cells, weights=z, minlength=n_rows * n_cols)
+    occupied = counts > 0
+    grid_z = np.full(n_rows * n_cols, np.nan, dtype=np.float32)
+    grid_z[occupied] = sums[occupied] / counts[occupied]
+    neighbourhood = np.ones((3, 3))
+    gaps = ndimage.binary_opening(~occupied.reshape(shape), neighbourhood).ravel()
+    holes = ~occupied & ~gaps
+    neighbour_counts = ndimage.convolve(counts.reshape(shape).astype(np.float64), neighbourhood, mode='constant').ravel()
+    neighbour_sums = ndimage.convolve(sums.reshape(shape), neighbourhood, mode='constant').ravel()
+    grid_z[holes] = np.divide(neighbour_sums[holes], neighbour_counts[holes],
+                              out=np.full(np.count_nonzero(holes), np.nan), where=neighbour_counts[holes] > 0)
+    if gaps.any():
+        rim_cells = np.flatnonzero(~gaps & ndimage.binary_dilation(gaps.reshape(shape), neighbourhood).ravel())
+        rim_cells = rim_cells[np.isfinite(grid_z[rim_cells])]
+        gap_cells = np.flatnonzero(gaps)
+        grid_z[gap_cells] = griddata((rim_cells % n_cols, rim_cells // n_cols), grid_z[rim_cells],
+                                     (gap_cells % n_cols, gap_cells // n_cols), method='linear')
+    return grid_z.reshape(n_rows, n_cols)
+
 def process_lidar_to_raster(las_file: str, output_raster: str, grid_size: float = 0.1, resolution: float = 0.1):
     """
     Extracts terrain points from a LAS file, creates a terrain model by interpolating the points onto a grid, 
@@ -38,38 +118,133 @@ def process_lidar_to_raster(las_file: str, output_raster: str, grid_size: float
         grid_size (float): The resolution of the grid.
         resolution (float): Resolution of the raster grid.
     """
-    las = laspy.read(las_file)
-    if hasattr(las, 'pred_class'):
-        terrain_mask = las.pred_class == 0
-        x, y, z = las.x[terrain_mask], las.y[terrain_mask], las.z[terrain_mask]
-        if len(x) == 0:
-            raise ValueError("No terrain points found (pred_class == 0).")
-    else:
-        raise ValueError("Missing 'pred_class' in point cloud data.")
-    if len(x) == 0 or len(y) == 0 or len(z) == 0:
-        raise ValueError("No terrain points to model. Check LiDAR data.")
-    print(f"Performing cubic interpolation...")
+    with laspy.open(las_file) as reader:
+        if 'pred_class' in reader.header.point_format.dimension_names:
+            xs, ys, zs = [np.empty(0)], [np.empty(0)], [np.empty(0, dtype=np.float32)]
+            for chunk in reader.chunk_iterator(_LAS_CHUNK_SIZE):
+                terrain_mask = np.asarray(chunk.pred_class) == 0
+                xs.append(np.asarray(chunk.x)[terrain_mask])
+                ys.append(np.asarray(chunk.y)[terrain_mask])
+                zs.append(np.asarray(chunk.z, dtype=np.float32)[terrain_mask])
+            x, y, z = np.concatenate(xs), np.concatenate(ys), np.concatenate(zs)
+        else:
+            raise ValueError("Missing 'pred_class' in point cloud data.")
+    if x.size == 0:
+        raise ValueError("No terrain points found (pred_class == 0).")
+    print(f"Interpolating terrain model...")
     x_min, x_max = np.min(x), np.max(x)
     y_min, y_max = np.min(y), np.max(y)
-    grid_x, grid_y = np.meshgrid(np.arange(x_min, x_max, grid_size),
-                                 np.arange(y_min, y_max, grid_size))
-    grid_z = griddata((x, y), z, (grid_x, grid_y), method='cubic')
-    x_min, x_max = np.min(grid_x), np.max(grid_x)
-    y_min, y_max = np.min(grid_y), np.max(grid_y)
-    transform = from_origin(x_min, y_max, resolution, resolution)
-    crs = pyproj.CRS("EPSG:2180")
-    grid_z = np.flipud(grid_z) 
+    n_cols = max(int(np.ceil((x_max - x_min) / grid_size)), 1)
+    n_rows = max(int(np.ceil((y_max - y_min) / grid_size)), 1)
+    grid_z = _interpolate_to_grid(x, y, z, x_min, y_min, grid_size, (n_rows, n_cols))
+    transform = from_origin(x_min, y_min + (n_rows - 1) * grid_size, resolution, resolution)
+    crs = _parse_crs("EPSG:2180")
     with rasterio.open(
         output_raster, 'w', driver='GTiff',
         height=grid_z.shape[0], width=grid_z.shape[1],
         count=1, dtype=grid_z.dtype,
         crs=crs.to_wkt(),
-        transform=transform
+        transform=transform,
+        tiled=True, blockxsize=256, blockysize=256,
+        compress='deflate', predictor=3, BIGTIFF='IF_SAFER'
     ) as dst:
         dst.write(grid_z, 1)
 
     print(f"Terrain model saved to {output_raster}")
 
+def _load_las(las_file: str):
+    """
+    Reads point coordinates from a LAS file.
+    
+    Args:
+        las_file (str): Path to the LAS file.
+    
+    Returns:
+        tuple: Arrays of x, y and z coordinates; z is stored as float32.
+    """
+    with laspy.open(las_file) as reader:
+        point_count = reader.header.point_count
+        x, y, z = np.empty(point_count), np.empty(point_count), np.empty(point_count, dtype=np.float32)
+        start = 0
+        for chunk in reader.chunk_iterator(_LAS_CHUNK_SIZE):
+            stop = start + len(chunk)
+            x[start:stop], y[start:stop], z[start:stop] = chunk.x, chunk.y, chunk.z
+            start = stop
+    return x[:start], y[:start], z[:start]
+
+def _build_point_index(x: np.ndarray, y: np.ndarray):
+    """
+    Builds a spatial index over point coordinates by sorting the points along the x axis.
+    
+    Args:
+        x (np.ndarray): X coordinates of the points.
+        y (np.ndarray): Y coordinates of the points.
+    
+    Returns:
+        tuple: Point indices in x order, and the x and y coordinates in that order.
+    """
+    order = np.argsort(x, kind='stable')
+    return order, x[order], y[order]
+
+def _bbox_candidates(x: np.ndarray, y: np.ndarray, polygon, tree=None):
+    """
+    Finds the points lying within the bounding box of a polygon.
+    
+    Args:
+        x (np.ndarray): X coordinates of the points.
+        y (np.ndarray): Y coordinates of the points.
+        polygon (shapely.geometry.Polygon): Polygon geometry to filter points by.
+        tree (tuple, optional): Index built with _build_point_index over x and y.
+            When given, only the points within the x range of the polygon are scanned.
+    
+    Returns:
+        np.ndarray: Sorted indices of the points.
+    """
+    minx, miny, maxx, maxy = polygon.bounds
+    if tree is not None:
+        order, sorted_x, sorted_y = tree
+        start = np.searchsorted(sorted_x, minx, side='left')
+        stop = np.searchsorted(sorted_x, maxx, side='right')
+        y_slice = sorted_y[start:stop]
+        return np.sort(order[start:stop][(y_slice >= miny) & (y_slice <= maxy)])
+    bbox_mask = (x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy)
+    return np.flatnonzero(bbox_mask)
+
+def _polygon_point_indices(x: np.ndarray, y: np.ndarray, polygon, tree=None):
+    """
+    Finds the points lying within a polygon.
+    
+    Args:
+        x (np.ndarray): X coordinates of the points.
+        y (np.ndarray): Y coordinates of the points.
+        polygon (shapely.geometry.Polygon): Polygon geometry to filter points by.
+        tree (tuple, optional): Index built with _build_point_index over x and y.
+    
+    Returns:
+        np.ndarray: Sorted indices of the points.
+    """
+    candidates = _bbox_candidates(x, y, polygon, tree)
+    inner = shapely.contains_xy(polygon, x[candidates], y[candidates])
+    return candidates[inner]
+
+def _filter_points(x: np.ndarray, y: np.ndarray, z: np.ndarray, polygon, tree=None):
+    """
+    Selects the points lying within a polygon.
+    
+    Args:
+        x (np.ndarray): X coordinates of the points.
+        y (np.ndarray): Y coordinates of the points.
+        z (np.ndarray): Z coordinates of the points.
+        polygon (shapely.geometry.Polygon): Polygon geometry to filter points by.
+        tree (tuple, optional): Index built with _build_point_index over x and y.
+    
+    Returns:
+        np.ndarray: Filtered points (x, y, z).
+    """
+    idx = _polygon_point_indices(x, y, polygon, tree)
+    filtered_points = np.column_stack((x[idx], y[idx], z[idx]))
+    return filtered_points
+
 def extract_polygon_points(las_file: str, polygon):
     """
     Extracts LiDAR points within a polygon from a LAS file.
@@ -81,28 +256,126 @@ def extract_polygon_points(las_file: str, polygon):
     Returns:
         np.ndarray: Filtered LiDAR points (x, y, z).
     """
-    las = laspy.read(las_file)
-    x, y, z = las.x, las.y, las.z
-    mask = vectorized.contains(polygon, x, y)
-    filtered_points = np.vstack((x[mask], y[mask], z[mask])).T
-    return filtered_points
+    x, y, z = _load_las(las_file)
+    return _filter_points(x, y, z, polygon)
 
-def get_dtm_values(raster_file: str, points: np.ndarray):
+def _dtm_window(transform, shape: tuple, bounds):
     """
-    Extracts DTM values for a set of points from a raster file.
+    Computes the raster window covering the given bounds, clipped to the raster extent.
     
     Args:
-        raster_file (str): Path to the DTM raster file.
+        transform (affine.Affine): Affine transform of the raster.
+        shape (tuple): Number of raster rows and columns.
+        bounds (tuple): Bounds (minx, miny, maxx, maxy) in the raster CRS.
+    
+    Returns:
+        rasterio.windows.Window or None: Window, or None if the bounds lie outside the raster.
+    """
+    minx, miny, maxx, maxy = bounds
+    rows, cols = rowcol(transform, [minx, maxx], [maxy, miny])
+    row_start, row_stop = max(min(rows), 0), min(max(rows) + 1, shape[0])
+    col_start, col_stop = max(min(cols), 0), min(max(cols) + 1, shape[1])
+    if row_start >= row_stop or col_start >= col_stop:
+        return None
+    return Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+def _read_dtm_window(src, bounds):
+    """
+    Reads the part of the first raster band that covers the given bounds.
+    
+    Args:
+        src (rasterio.io.DatasetReader): Open DTM raster.
+        bounds (tuple): Bounds (minx, miny, maxx, maxy) in the raster CRS.
+    
+    Returns:
+        tuple: Raster block, its affine transform and the value used for locations outside the raster.
+    """
+    window = _dtm_window(src.transform, (src.height, src.width), bounds)
+    fill_value = src.nodata or 0
+    if window is None:
+        return np.empty((0, 0), dtype=np.float64), src.transform, fill_value
+    return src.read(1, window=window), src.window_transform(window), fill_value
+
+def _slice_dtm_block(block: np.ndarray, transform, bounds):
+    """
+    Takes the part of an in-memory DTM block that covers the given bounds, without copying it.
+    
+    Args:
+        block (np.ndarray): Raster block, as read by _read_dtm_window.
+        transform (affine.Affine): Affine transform of the block.
+        bounds (tuple): Bounds (minx, miny, maxx, maxy) in the raster CRS.
+    
+    Returns:
+        tuple: View of the block and its affine transform.
+    """
+    window = _dtm_window(transform, block.shape, bounds)
+    if window is None:
+        return block[:0, :0], transform
+    return block[window.toslices()], window_transform(window, transform)
+
+def _lookup_dtm(block: np.ndarray, transform, fill_value: float, points: np.ndarray):
+    """
+    Looks up raster values for a set of points in a block read by _read_dtm_window.
+    
+    Args:
+        block (np.ndarray): Raster block.
+        transform (affine.Affine): Affine transform of the block.
+        fill_value (float): Value returned for points outside the block.
+        points (np.ndarray): Array of points (x, y, ...).
+    
+    Returns:
+        np.ndarray: Array of raster values corresponding to the points.
+    """
+    rows, cols = rowcol(transform, points[:, 0], points[:, 1])
+    rows, cols = np.asarray(rows), np.asarray(cols)
+    inside = (rows >= 0) & (rows < block.shape[0]) & (cols >= 0) & (cols < block.shape[1])
+    values = np.full(len(points), fill_value, dtype=block.dtype)
+    values[inside] = block[rows[inside], cols[inside]]
+    return values
+
+def _sample_dtm(src, points: np.ndarray):
+    """
+    Samples DTM values point by point. The points are visited in raster row/column order,
+    so consecutive samples fall in the same raster blocks.
+    
+    Args:
+        src (rasterio.io.DatasetReader): Open DTM raster.
+        points (np.ndarray): Array of points (x, y, ...).
+    
+    Returns:
+        np.ndarray: Array of DTM values corresponding to the points.
+    """
+    rows, cols = rowcol(src.transform, points[:, 0], points[:, 1])
+    order = np.lexsort((cols, rows))
+    samples = src.sample(points[order, :2], indexes=1)
+    dtm_values = np.empty(len(points), dtype=np.float64)
+    dtm_values[order] = np.fromiter((value[0] for value in samples), dtype=np.float64, count=len(points))
+    return dtm_values
+
+def get_dtm_values(src, points: np.ndarray):
+    """
+    Extracts DTM values for a set of points from a raster.
+    
+    Args:
+        src (rasterio.io.DatasetReader or str): Open DTM raster, or a path to the raster file.
         points (np.ndarray): Array of points for which DTM values are to be extracted.
     
     Returns:
         np.ndarray: Array of DTM values corresponding to the points.
     """
+    if isinstance(src, (str, os.PathLike)):
+        with rasterio.open(src) as dataset:
+            return get_dtm_values(dataset, points)
+    if len(points) == 0:
+        return np.empty(0, dtype=np.float64)
     print("Getting DTM values ​​for points...")
-    with rasterio.open(raster_file) as src:
-        coords = [(pt[0], pt[1]) for pt in points]
-        dtm_values = list(src.sample(coords))
-        dtm_values = np.array(dtm_values).flatten()
+    bounds = (points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max())
+    window = _dtm_window(src.transform, (src.height, src.width), bounds)
+    if window is not None and window.width * window.height > _MAX_DTM_WINDOW_CELLS:
+        dtm_values = _sample_dtm(src, points)
+    else:
+        block, transform, fill_value = _read_dtm_window(src, bounds)
+        dtm_values = _lookup_dtm(block, transform, fill_value, points)
     print("DTM values ​​have been downloaded.")
     return dtm_values
 
@@ -116,11 +389,63 @@ def load_geojson(geojson_path: str):
     Returns:
         geopandas.GeoDataFrame: Loaded GeoDataFrame.
     """
-    gdf = gpd.read_file(geojson_path)
+    gdf = gpd.read_file(geojson_path, engine="pyogrio")
     print(f"Loaded GeoJSON file with columns: {gdf.columns}")
     return gdf
 
-def calculate_volume_and_area(las_file: str, geojson_path: str, raster_file: str, output_csv: str):   
+def _process_heap(polygon, x: np.ndarray, y: np.ndarray, z: np.ndarray,
+                  dtm_block: np.ndarray, dtm_transform, dtm_fill_value: float):
+    """
+    Calculates the volume, surface area, and coverage for a single polygon. Heights are compared
+    with the DTM at their stored precision, so a point lying exactly on the terrain (such as the
+    only point behind a DTM node) is not counted as above it.
+    
+    Args:
+        polygon (shapely.geometry.Polygon): Heap polygon.
+        x (np.ndarray): X coordinates of the LiDAR points around the polygon.
+        y (np.ndarray): Y coordinates of the LiDAR points around the polygon.
+        z (np.ndarray): Z coordinates of the LiDAR points around the polygon.
+        dtm_block (np.ndarray): DTM block covering the polygon, as read by _read_dtm_window.
+        dtm_transform (affine.Affine): Affine transform of the DTM block.
+        dtm_fill_value (float): DTM value used for points outside the block.
+    
+    Returns:
+        tuple or None: Volume, surface area and coverage of the heap, or None if no LiDAR points
+            lie within the polygon.
+    """
+    idx = _polygon_point_indices(x, y, polygon)
+    if len(idx) == 0:
+        return None
+    dtm_values = _lookup_dtm(dtm_block, dtm_transform, dtm_fill_value, np.column_stack((x[idx], y[idx])))
+    height_diff = z[idx] - dtm_values
+    above_dtm_mask = height_diff > 0
+    volume = np.sum(height_diff, where=above_dtm_mask, dtype=np.float64)
+    total_area = len(idx)             
+    surface_area = np.count_nonzero(above_dtm_mask)
+    coverage = (surface_area / total_area) * 100 if total_area > 0 else 0
+    return volume, total_area, coverage
+
+def _heap_tasks(gdf, x: np.ndarray, y: np.ndarray, z: np.ndarray, tree, src):
+    """
+    Yields the _process_heap arguments for every polygon, limited to the points and
+    DTM block around that polygon. The DTM under all polygons is read in one go unless
+    that window exceeds _MAX_DTM_WINDOW_CELLS, in which case each polygon reads its own.
+    """
+    window = _dtm_window(src.transform, (src.height, src.width), gdf.total_bounds)
+    shared_read = window is None or window.width * window.height <= _MAX_DTM_WINDOW_CELLS
+    if shared_read:
+        dtm, dtm_transform, dtm_fill_value = _read_dtm_window(src, gdf.total_bounds)
+    for polygon, pred_id in zip(gdf.geometry.values, gdf['pred_ID'].values):
+        print(f"Processing heap ID: {pred_id}...")
+        candidates = _bbox_candidates(x, y, polygon, tree)
+        if shared_read:
+            dtm_block, block_transform = _slice_dtm_block(dtm, dtm_transform, polygon.bounds)
+        else:
+            dtm_block, block_transform, dtm_fill_value = _read_dtm_window(src, polygon.bounds)
+        yield (polygon, x[candidates], y[candidates], z[candidates],
+               dtm_block, block_transform, dtm_fill_value)
+
+def calculate_volume_and_area(las_file: str, geojson_path: str, raster_file: str, output_csv: str, workers: int = 1):   
     """
     Calculates the volume, surface area, and coverage for polygons in a GeoJSON file 
     based on LiDAR points and DTM values.
@@ -131,45 +456,62 @@ def calculate_volume_and_area(las_file: str, geojson_path: str, raster_file: str
         raster_file (str): Path to the DTM raster file.
         output_csv (str): Path to save the CSV file with results.
         output_geojson (str): Path to save the GeoJSON file with results.
+        workers (int): Number of processes used to process the polygons. Defaults to 1.
     """
+    if workers < 1:
+        raise ValueError(f"Number of workers must be at least 1, got {workers}.")
     gdf = load_geojson(geojson_path)
-    results = []
-    for _, row in gdf.iterrows():
-        polygon = row['geometry']
-        pred_id = row['pred_ID']
-        print(f"Processing heap ID: {pred_id}...")
-        filtered_points = extract_polygon_points(las_file, polygon)
-        if len(filtered_points) == 0:
+    x, y, z = _load_las(las_file)
+    minx, miny, maxx, maxy = gdf.total_bounds
+    in_bounds = (x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy)
+    x, y, z = x[in_bounds], y[in_bounds], z[in_bounds]
+    tree = _build_point_index(x, y) if len(gdf) >= _MIN_POLYGONS_FOR_INDEX else None
+    with rasterio.open(raster_file) as src:
+        tasks = _heap_tasks(gdf, x, y, z, tree, src)
+        if workers == 1:
+            heap_results = [_process_heap(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_process_heap, *task) for task in tasks]
+                heap_results = [future.result() for future in futures]
+    pred_ids = gdf['pred_ID'].values
+    volumes = np.empty(len(gdf))
+    surface_areas = np.empty(len(gdf), dtype=np.int64)
+    coverages = np.empty(len(gdf))
+    found = np.zeros(len(gdf), dtype=bool)
+    for i, (pred_id, result) in enumerate(zip(pred_ids, heap_results)):
+        if result is None:
             print(f"No LiDAR points found for heap ID: {pred_id}. Skipping...")
             continue
-        dtm_values = get_dtm_values(raster_file, filtered_points)
-        height_diff = filtered_points[:, 2] - dtm_values
-        above_dtm_mask = height_diff > 0
-        volume = np.sum(height_diff[above_dtm_mask])  
-        total_area = len(filtered_points)             
-        surface_area = np.sum(above_dtm_mask)         
-        coverage = (surface_area / total_area) * 100 if total_area > 0 else 0
-        results.append({
-            "pred_ID": pred_id,
-            "volume_m3": volume,
-            "surface_3D_m2": total_area,
-            "coverage_percent": coverage,
-            "geometry": polygon
-        })
+        volumes[i], surface_areas[i], coverages[i] = result
+        found[i] = True
         print(f"Heap ID: {pred_id}")
-        print(f"Volume: {volume:.2f} m³")
-        print(f"Surface Area: {total_area:.2f} m²")
-        print(f"Point Coverage: {coverage:.2f}%")
+        print(f"Volume: {volumes[i]:.2f} m³")
+        print(f"Surface Area: {surface_areas[i]:.2f} m²")
+        print(f"Point Coverage: {coverages[i]:.2f}%")
         print("-" * 40)
 
-    df = pd.DataFrame(results)
-    df.drop(columns=["geometry"], inplace=True)
+    df = pd.DataFrame({
+        "pred_ID": pred_ids[found],
+        "volume_m3": volumes[found],
+        "surface_3D_m2": surface_areas[found],
+        "coverage_percent": coverages[found]
+    })
     df.to_csv(output_csv, index=False, encoding="utf-8")
     print(f"Results saved to {output_csv}")
-    gdf_results = gpd.GeoDataFrame(results, geometry="geometry", crs="EPSG:2180")
-    gdf_results.to_file(geojson_path, driver="GeoJSON")
+    gdf_results = gpd.GeoDataFrame(df, geometry=gdf.geometry.values[found], crs=_parse_crs("EPSG:2180"))
+    gdf_results.to_file(geojson_path, driver="GeoJSON", engine="pyogrio")
     print(f"Results saved to {geojson_path}")
 
+def _positive_int(value: str):
+    """
+    Parses a command line value as a positive integer.
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+    return number
+
 def parse_arguments():
     """
     Parse command line arguments.
@@ -183,10 +525,11 @@ def parse_arguments():
     parser.add_argument('las_file', help="Path to the LAS file")
     parser.add_argument('output_raster', help="Path to save the DTM raster file")
     parser.add_argument('output_csv', help="Path to save the CSV file with results")    
+    parser.add_argument('--workers', type=_positive_int, default=1, help="Number of processes used to process the polygons")
     return parser.parse_args()
 
 if __name__ == "__main__":
     args = parse_arguments()
     transform_polygons(args.input_geojson, args.output_geojson)
     process_lidar_to_raster(args.las_file, args.output_raster, grid_size = 0.1, resolution = 0.1)
-    calculate_volume_and_area(args.las_file, args.output_geojson, args.output_raster, args.output_csv)
+    calculate_volume_and_area(args.las_file, args.output_geojson, args.output_raster, args.output_csv, args.workers)
@@ -1,9 +1,55 @@
+import os
+import tempfile
 import unittest
+import warnings
 from unittest.mock import patch, MagicMock, ANY
 import geopandas as gpd
 import numpy as np
+import pandas as pd
+import pyproj
+from pathlib import Path
+import rasterio
+import shapely
+from rasterio.transform import from_origin, rowcol
+from rasterio.windows import transform as window_transform
 from shapely.geometry import Polygon
 from heap_volume_analysis import *
+from heap_volume_analysis import _build_point_index, _filter_points, _interpolate_to_grid, _process_heap
+
+def mock_raster(band, transform):
+    """Builds a mock raster dataset serving reads from an in-memory band."""
+    src = MagicMock(spec=rasterio.io.DatasetReader)
+    src.transform = transform
+    src.height, src.width = band.shape
+    src.nodata = None
+    src.read.side_effect = lambda index, window: band[window.toslices()]
+    src.window_transform.side_effect = lambda window: window_transform(window, transform)
+
+    def sample(xy, indexes):
+        for x, y in xy:
+            row, col = rowcol(transform, x, y)
+            inside = 0 <= row < band.shape[0] and 0 <= col < band.shape[1]
+            yield np.array([band[row, col] if inside else 0.0])
+
+    src.sample.side_effect = sample
+    return src
+
+def mock_las_file(x, y, z, pred_class, chunk_size=2):
+    """Builds a mock laspy.open result that serves the points in chunks."""
+    reader = MagicMock()
+    reader.header.point_count = len(x)
+    reader.header.point_format.dimension_names = ['X', 'Y', 'Z', 'pred_class']
+    chunks = []
+    for start in range(0, len(x), chunk_size):
+        chunk = MagicMock()
+        chunk.x, chunk.y, chunk.z = x[start:start + chunk_size], y[start:start + chunk_size], z[start:start + chunk_size]
+        chunk.pred_class = pred_class[start:start + chunk_size]
+        chunk.__len__.return_value = len(chunk.x)
+        chunks.append(chunk)
+    reader.chunk_iterator.return_value = chunks
+    las_file = MagicMock()
+    las_file.__enter__.return_value = reader
+    return las_file
 
 class TestDTMFunctions(unittest.TestCase):
     @patch('geopandas.read_file')
@@ -15,69 +61,156 @@ class TestDTMFunctions(unittest.TestCase):
         mock_read_file.return_value = mock_gdf
         result = transform_polygons('input.geojson', 'output.geojson', 'EPSG:2180')
         mock_gdf.to_crs.assert_called_with('EPSG:2180')
+        mock_read_file.assert_called_with('input.geojson', engine="pyogrio")
+        mock_gdf.to_file.assert_called_with('output.geojson', driver="GeoJSON", engine="pyogrio")
         self.assertEqual(result, mock_gdf)
 
-    @patch('laspy.read')
+    def test_transform_polygons_with_transformer(self):
+        """Test reprojecting polygons with a prebuilt transformer."""
+        polygons = [Polygon([(19.0, 52.0), (19.1, 52.0), (19.1, 52.1)]),
+                    Polygon([(19.2, 52.0, 110.0), (19.3, 52.0, 120.0), (19.3, 52.1, 130.0)])]
+        gdf = gpd.GeoDataFrame({"pred_ID": [1, 2]}, geometry=polygons, crs="EPSG:4326")
+        transformer = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:2180", always_xy=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_file = os.path.join(tmp_dir, 'output.geojson')
+            with patch('geopandas.read_file', return_value=gdf):
+                transform_polygons('input.geojson', output_file, transformer=transformer)
+            result = gpd.read_file(output_file)
+        expected = gdf.to_crs("EPSG:2180")
+        self.assertEqual(result.crs, expected.crs)
+        self.assertTrue(result.geometry.geom_equals_exact(expected.geometry, tolerance=1e-6).all())
+        self.assertEqual(list(result.geometry.has_z), [False, True])
+        self.assertTrue(np.allclose(shapely.get_coordinates(result.geometry.values[1], include_z=True),
+                                    shapely.get_coordinates(expected.geometry.values[1], include_z=True)))
+
+    @patch('laspy.open')
     @patch('rasterio.open')
-    def test_process_lidar_to_raster(self, mock_rasterio_open, mock_laspy_read):
+    def test_process_lidar_to_raster(self, mock_rasterio_open, mock_laspy_open):
         """Test LiDAR data processing and raster creation."""
-        mock_las = MagicMock()
-        mock_las.x = np.array([1, 2, 3, 4])
-        mock_las.y = np.array([1, 3, 1, 3])
-        mock_las.z = np.array([1, 2, 3, 4])
-        mock_las.pred_class = np.array([0, 0, 0, 0])  
-        mock_laspy_read.return_value = mock_las
+        mock_laspy_open.return_value = mock_las_file(np.array([1, 2, 3, 4]), np.array([1, 3, 1, 3]), np.array([1, 2, 3, 4]), np.array([0, 0, 0, 0]))
         mock_raster = MagicMock()
         mock_rasterio_open.return_value.__enter__.return_value = mock_raster
         process_lidar_to_raster('input.las', 'output.tif')
         mock_rasterio_open.assert_called_with('output.tif', 'w', driver='GTiff', height=ANY,
-        width=ANY, count=1, dtype=ANY, crs=ANY, transform=ANY)
+        width=ANY, count=1, dtype=ANY, crs=ANY, transform=ANY, tiled=True, blockxsize=256,
+        blockysize=256, compress='deflate', predictor=3, BIGTIFF='IF_SAFER')
+
+    def test_interpolate_to_grid(self):
+        """Test gridding a plane whose points leave a hole in the middle."""
+        grid_x, grid_y = np.meshgrid(np.arange(20) * 0.5, np.arange(10) * 0.5)
+        hole = (grid_x > 2) & (grid_x < 6) & (grid_y > 1.5) & (grid_y < 3.5)
+        x, y = grid_x[~hole], grid_y[~hole]
+        grid_z = _interpolate_to_grid(x, y, x + 2 * y, 0.0, 0.0, 0.5, (10, 20))
+        expected = np.flipud(grid_x + 2 * grid_y)
+        self.assertEqual(grid_z.dtype, np.float32)
+        self.assertTrue(np.allclose(grid_z[~np.flipud(hole)], expected[~np.flipud(hole)]))
+        self.assertTrue(np.allclose(grid_z, expected, atol=1e-4))
+
+        # A gap bordering two northern rows with only a few points, whose holes have no neighbours.
+        sparse_rows = (grid_y >= 4.0) & (np.arange(20) % 9 != 0)
+        gap = (grid_x > 3) & (grid_x < 7) & (grid_y > 1.5) & (grid_y < 4)
+        x, y = grid_x[~(sparse_rows | gap)], grid_y[~(sparse_rows | gap)]
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            grid_z = _interpolate_to_grid(x, y, x + 2 * y, 0.0, 0.0, 0.5, (10, 20))
+        self.assertTrue(np.isnan(grid_z[0, 2:8]).all())
+        self.assertTrue(np.allclose(grid_z[3:], expected[3:], atol=1e-4))
+
+    @patch('laspy.open')
+    def test_process_lidar_to_raster_without_terrain(self, mock_laspy_open):
+        """Test that a point cloud without terrain points is rejected."""
+        mock_laspy_open.return_value = mock_las_file(np.array([1, 2]), np.array([1, 2]), np.array([1, 2]), np.array([1, 1]))
+        with self.assertRaises(ValueError):
+            process_lidar_to_raster('input.las', 'output.tif')
 
-    @patch('laspy.read')
-    def test_extract_polygon_points(self, mock_laspy_read):
+    @patch('laspy.open')
+    def test_extract_polygon_points(self, mock_laspy_open):
         """Test point extraction within a given polygon."""
-        mock_las = MagicMock()
-        mock_las.x = np.array([1, 2, 3])
-        mock_las.y = np.array([1, 2, 3])
-        mock_las.z = np.array([1, 2, 3])
-        mock_las.pred_class = np.array([0, 0, 0]) 
-        mock_laspy_read.return_value = mock_las
+        mock_laspy_open.return_value = mock_las_file(np.array([1, 2, 3]), np.array([1, 2, 3]), np.array([1, 2, 3]), np.array([0, 0, 0]))
         polygon = Polygon([(0, 0), (0, 5), (5, 5), (5, 0)]) 
         result = extract_polygon_points('input.las', polygon)
         self.assertEqual(result.shape[0], 3)  
         self.assertTrue(np.array_equal(result[:, 0], [1, 2, 3]))
 
+    def test_filter_points_with_index(self):
+        """Test that the spatial index selects the same points as a full scan."""
+        x = np.array([1.0, 2.0, 6.0, 4.0, -1.0])
+        y = np.array([1.0, 4.0, 2.0, 4.5, 3.0])
+        z = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+        polygon = Polygon([(0, 0), (0, 5), (5, 5), (5, 0)])
+        tree = _build_point_index(x, y)
+        result = _filter_points(x, y, z, polygon, tree)
+        self.assertTrue(np.array_equal(result, _filter_points(x, y, z, polygon)))
+        self.assertTrue(np.array_equal(result[:, 2], [1.0, 2.0, 4.0]))
+
+    def test_process_heap_terrain_ties(self):
+        """Test that points lying exactly on the terrain are not counted as above it."""
+        x = np.array([0.5, 1.5, 2.5])
+        y = np.array([0.5, 0.5, 0.5])
+        z = np.array([0.1, 0.3, 0.1], dtype=np.float32)
+        block = np.full((1, 3), 0.1, dtype=np.float32)
+        polygon = Polygon([(0, 0), (0, 1), (3, 1), (3, 0)])
+        volume, total_area, coverage = _process_heap(polygon, x, y, z, block, from_origin(0, 1, 1, 1), 0)
+        self.assertAlmostEqual(volume, 0.2, places=6)
+        self.assertEqual(total_area, 3)
+        self.assertAlmostEqual(coverage, 100 / 3)
+
     @patch('rasterio.open')
     def test_get_dtm_values(self, mock_rasterio_open):
         """Test extracting DTM values for given points."""
-        mock_src = MagicMock()
-        mock_src.sample.return_value = [(1.0), (2.0), (3.0)]  
+        band = np.arange(16, dtype=np.float64).reshape(4, 4)
+        mock_src = mock_raster(band, from_origin(0, 4, 1, 1))
         mock_rasterio_open.return_value.__enter__.return_value = mock_src
-        points = np.array([[1, 1], [2, 2], [3, 3]])  
+        points = np.array([[0.5, 3.5], [1.5, 2.5], [3.5, 0.5], [10, 10]])
         dtm_values = get_dtm_values('dtm.tif', points)
-        self.assertEqual(len(dtm_values), 3)  
-        self.assertEqual(dtm_values[0], 1.0)
+        self.assertTrue(np.array_equal(dtm_values, [0.0, 5.0, 15.0, 0.0]))
+        dtm_values = get_dtm_values(Path('dtm.tif'), points)
+        self.assertEqual(len(dtm_values), 4)
+        with patch('heap_volume_analysis._MAX_DTM_WINDOW_CELLS', 4):
+            dtm_values = get_dtm_values(mock_src, points)
+        mock_src.sample.assert_called_once()
+        self.assertTrue(np.array_equal(dtm_values, [0.0, 5.0, 15.0, 0.0]))
 
     @patch('geopandas.read_file')
-    @patch('laspy.read')
+    @patch('laspy.open')
     @patch('rasterio.open')
-    def test_calculate_volume_and_area(self, mock_rasterio_open, mock_laspy_read, mock_gpd_read_file):
-        """Test volume and area calculation for polygon with DTM and LiDAR data."""
-        mock_gdf = MagicMock(spec=gpd.GeoDataFrame)
-        mock_gdf.iterrows.return_value = iter([(0, {"geometry": Polygon([(0, 0), (0, 5), (5, 5), (5, 0)]), "pred_ID": 1})])
-        mock_gpd_read_file.return_value = mock_gdf
-        mock_las = MagicMock()
-        mock_las.x = np.array([1, 2, 1])
-        mock_las.y = np.array([1, 1, 2])
-        mock_las.z = np.array([5, 6, 7])
-        mock_las.pred_class = np.array([0, 0, 0])
-        mock_laspy_read.return_value = mock_las
-        mock_src = MagicMock()
-        mock_src.sample.return_value = [(1.0), (2.0), (3.0)]
+    def run_calculate_volume_and_area(self, mock_rasterio_open, mock_laspy_open, mock_gpd_read_file, **kwargs):
+        """Runs calculate_volume_and_area on two polygons and returns the CSV results."""
+        polygons = [Polygon([(0, 0), (0, 5), (5, 5), (5, 0)]), Polygon([(8, 8), (8, 9), (9, 9), (9, 8)])]
+        mock_gpd_read_file.return_value = gpd.GeoDataFrame({"pred_ID": [1, 2]}, geometry=polygons, crs="EPSG:2180")
+        mock_laspy_open.return_value = mock_las_file(np.array([1, 2, 1, 7]), np.array([1, 1, 2, 7]), np.array([5, 6, 0.5, 9]), np.array([0, 0, 0, 0]))
+        mock_src = mock_raster(np.ones((10, 10)), from_origin(0, 10, 1, 1))
         mock_rasterio_open.return_value.__enter__.return_value = mock_src
-        calculate_volume_and_area('input.las', 'input.geojson', 'dtm.tif', 'output.csv')
-        mock_gpd_read_file.assert_called_with('input.geojson')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            geojson_path = os.path.join(tmp_dir, 'input.geojson')
+            output_csv = os.path.join(tmp_dir, 'output.csv')
+            calculate_volume_and_area('input.las', geojson_path, 'dtm.tif', output_csv, **kwargs)
+            results = pd.read_csv(output_csv)
+        mock_laspy_open.assert_called_once_with('input.las')
+        mock_gpd_read_file.assert_called_with(geojson_path, engine="pyogrio")
         mock_rasterio_open.assert_called_with('dtm.tif')
+        return results
+
+    def test_calculate_volume_and_area(self):
+        """Test volume and area calculation for polygon with DTM and LiDAR data."""
+        results = self.run_calculate_volume_and_area()
+        self.assertEqual(list(results["pred_ID"]), [1])
+        self.assertAlmostEqual(results["volume_m3"][0], 9.0)
+        self.assertEqual(results["surface_3D_m2"][0], 3)
+        self.assertAlmostEqual(results["coverage_percent"][0], 200 / 3)
+
+    def test_calculate_volume_and_area_per_polygon_reads(self):
+        """Test that reading the DTM per polygon gives the results of the shared read."""
+        with patch('heap_volume_analysis._MAX_DTM_WINDOW_CELLS', 1):
+            results = self.run_calculate_volume_and_area()
+        pd.testing.assert_frame_equal(results, self.run_calculate_volume_and_area())
+
+    def test_calculate_volume_and_area_workers(self):
+        """Test that processing polygons in worker processes gives the sequential results."""
+        results = self.run_calculate_volume_and_area(workers=2)
+        pd.testing.assert_frame_equal(results, self.run_calculate_volume_and_area())
+        with self.assertRaises(ValueError):
+            calculate_volume_and_area('input.las', 'input.geojson', 'dtm.tif', 'output.csv', workers=0)
 
 if __name__ == '__main__':
     unittest.main()